@@ -1,16 +1,32 @@
 import os
 import asyncio
+import contextlib
+import hashlib
+import logging
 import uuid
 import json
 import re
 import google.generativeai as genai
 import httpx
+import numpy as np
+import orjson
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
-from supabase import create_client, Client
+from fastapi.responses import ORJSONResponse
+from supabase._async.client import create_client as acreate_client
 from pydantic import BaseModel, Field, ValidationError
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import List, Optional
+from collections import OrderedDict
+from itertools import chain
+
+try:
+    import ijson
+except ImportError:  # Optional: without it the sales list is downloaded and parsed in one go.
+    ijson = None
 
 # --- Configuration ---
 class Settings(BaseSettings):
@@ -18,24 +34,68 @@ class Settings(BaseSettings):
     supabase_key: str
     gemini_api_key: str
     blockchain_service_url: str = "http://127.0.0.1:8001"
+    blockchain_max_conns: int = 200
+    blockchain_keepalive: int = 50
+    blockchain_keepalive_expiry: float = 30.0
+    log_level: str = "INFO"
+    redis_url: Optional[str] = None
+    workers: int = 1
 
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=False)
 
 settings = Settings()
 
+# --- Logging ---
+logging.basicConfig(
+    level=settings.log_level.upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+logger = logging.getLogger(__name__)
+
 # --- Initialize Clients ---
-supabase: Client = create_client(settings.supabase_url, settings.supabase_key)
 genai.configure(api_key=settings.gemini_api_key)
 
 # --- Initialize FastAPI App ---
 app = FastAPI(
     title="Jharkhand Tourism MVP Backend",
     description="Main API for the Jharkhand Tourism hackathon project.",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
+# --- Lifecycle ---
+@app.on_event("startup")
+async def startup():
+    # A single shared client keeps the connection pool (and TLS sessions) to the
+    # blockchain service alive across requests instead of reconnecting every call.
+    app.state.http = httpx.AsyncClient(
+        base_url=settings.blockchain_service_url,
+        timeout=httpx.Timeout(30.0),
+        limits=httpx.Limits(
+            max_connections=settings.blockchain_max_conns,
+            max_keepalive_connections=settings.blockchain_keepalive,
+            keepalive_expiry=settings.blockchain_keepalive_expiry
+        ),
+        # h2 is only negotiated via TLS ALPN, so this matters for an https:// blockchain
+        # URL whose server supports it; the default plain-HTTP gateway stays on HTTP/1.1
+        # and relies on the keep-alive pool above.
+        http2=True
+    )
+    app.state.supabase = await acreate_client(settings.supabase_url, settings.supabase_key)
+    # Redis is optional; when configured it shares chatbot state across workers.
+    app.state.redis = connect_redis(settings.redis_url) if settings.redis_url else None
+    app.state.activity_queue = asyncio.Queue(maxsize=ACTIVITY_QUEUE_SIZE)
+    app.state.activity_writer = asyncio.create_task(activity_log_writer(app.state.activity_queue))
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Let the writer flush whatever is still queued before the clients go away.
+    await app.state.activity_queue.put(None)
+    await app.state.activity_writer
+    await app.state.http.aclose()
+    if app.state.redis is not None:
+        await app.state.redis.aclose()
+
 # --- Middleware ---
 app.add_middleware(
     CORSMiddleware,
@@ -47,10 +107,10 @@ app.add_middleware(
 
 # --- Chatbot Knowledge Base & State ---
 try:
-    with open("places.json", "r") as f:
-        places = json.load(f)
+    with open("places.json", "rb") as f:
+        places = orjson.loads(f.read())
 except FileNotFoundError:
-    print("WARNING: places.json not found. Chatbot knowledge base will be empty.")
+    logger.warning("places.json not found. Chatbot knowledge base will be empty.")
     places = {}
 
 interest_map = {
@@ -58,7 +118,47 @@ interest_map = {
     "wildlife": ["betla"],
     "pilgrimage": ["deoghar"]
 }
-greeted_users = set()
+GREETING_TTL = 86400  # seconds
+REDIS_TIMEOUT = 0.5  # seconds; a hung Redis must fall back to local state, not stall /chat
+greeted_users = TTLCache(maxsize=100_000, ttl=GREETING_TTL)
+
+# Matchers are built once at import; the place names are folded into a single
+# alternation so a message is scanned in one pass instead of once per place.
+ITINERARY_RE = re.compile(r"itinerary|plan.*day")
+ITINERARY_SCAN_LIMIT = 256  # itinerary requests state their intent early in the message
+DAYS_RE = re.compile(r"(\d+)\s*day")
+PLACE_RE = (
+    re.compile("|".join(re.escape(p) for p in sorted(places, key=len, reverse=True)))
+    if places else None
+)
+INTEREST_KEYS = tuple(interest_map)
+
+# Itinerary inputs are static, so each place's day line is formatted once up front.
+ALL_PLACES = tuple(places)
+INTEREST_PLACES = {interest: tuple(names) for interest, names in interest_map.items()}
+
+def format_place_line(place_name: str, info: dict) -> str:
+    return (
+        f"📍 {place_name.capitalize()} - {info.get('description', 'N/A')}\n"
+        f"   🕒 Best time: {info.get('best_time', 'N/A')}\n"
+        f"   🎯 Activities: {info.get('activities', 'N/A')}"
+    )
+
+PLACE_LINES = {
+    name: format_place_line(name, places.get(name, {}))
+    for name in chain(ALL_PLACES, chain.from_iterable(INTEREST_PLACES.values()))
+}
+
+# --- Verification Cache ---
+# A sale recorded on-chain never changes, so a verified (product_id, tx_id) pair can be
+# served from memory. Each product's sales, indexed by txID, are kept only briefly so
+# lookups of other tx_ids for the same product skip the blockchain round-trip.
+verified_sales = TTLCache(maxsize=10_000, ttl=3600)
+sales_index_by_product = TTLCache(maxsize=1_000, ttl=30)
+# After an early match, up to this many unread bytes are drained so the connection can go
+# back to the keep-alive pool; a longer tail is abandoned and the connection is closed.
+SALES_DRAIN_LIMIT = 64 * 1024
+JSON_DECODE_ERRORS = (json.JSONDecodeError, ijson.JSONError) if ijson else (json.JSONDecodeError,)
 
 
 # --- Pydantic Models ---
@@ -67,16 +167,14 @@ class Product(BaseModel):
     id: int
     name: str
     description: str
-    image_url: Optional[str] = Field(default=None, alias="image_url")
+    image_url: Optional[str] = None
     price: float
-    artisan_name: str = Field(alias="artisan_name")
-
-    class Config:
-        populate_by_name = True
+    artisan_name: str
 
 class TransactionRequest(BaseModel):
     product_id: int = Field(..., alias="productId")
     price: float
+    user_id: Optional[str] = "guest"
 
 class ActivityLogRequest(BaseModel):
     user_id: Optional[str] = "guest"
@@ -93,40 +191,355 @@ class SaleReceipt(BaseModel):
     txID: str
 
 
-# --- Chatbot Helper Function ---
-async def query_gemini(message: str, max_tokens: int = 250) -> str:
-    model = genai.GenerativeModel("gemini-1.5-flash")
+# --- Gemini Reply Cache ---
+class SemanticReplyCache:
+    """
+    Holds (embedding, reply) pairs and returns the stored reply whose embedding is closest
+    to a query, provided the cosine similarity reaches `threshold`. Once `capacity` is
+    reached the least recently used entry is overwritten.
+    """
+    def __init__(self, capacity: int = 2048, threshold: float = 0.92):
+        self.capacity = capacity
+        self.threshold = threshold
+        self._vectors = None
+        self._replies: List[str] = []
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._clock = 0
+
+    def _touch(self, slot: int):
+        self._clock += 1
+        self._last_used[slot] = self._clock
+
+    def lookup(self, embedding: np.ndarray) -> Optional[str]:
+        if not self._replies:
+            return None
+        # Embeddings are stored unit-length, so one matrix-vector product gives every cosine.
+        scores = self._vectors[:len(self._replies)] @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        self._touch(best)
+        return self._replies[best]
+
+    def add(self, embedding: np.ndarray, reply: str):
+        if self._vectors is None:
+            self._vectors = np.empty((self.capacity, embedding.shape[0]), dtype=np.float32)
+        if len(self._replies) < self.capacity:
+            slot = len(self._replies)
+            self._replies.append(reply)
+        else:
+            slot = int(np.argmin(self._last_used))
+            self._replies[slot] = reply
+        self._vectors[slot] = embedding
+        self._touch(slot)
+
+# With REDIS_URL set the exact tier lives in Redis so every worker shares it; the local
+# LRU is used otherwise, and whenever Redis is unreachable.
+EXACT_CACHE_SIZE = 1024
+GEMINI_REPLY_TTL = 86400  # seconds
+gemini_exact_cache: "OrderedDict[str, str]" = OrderedDict()
+gemini_semantic_cache = SemanticReplyCache()
+
+def reply_cache_key(key: str) -> str:
+    return "gemini:" + hashlib.sha256(key.encode()).hexdigest()
+
+async def get_cached_reply(key: str) -> Optional[str]:
+    if app.state.redis is not None:
+        try:
+            cached_reply = await app.state.redis.get(reply_cache_key(key))
+            return cached_reply.decode() if cached_reply is not None else None
+        except RedisError as e:
+            logger.warning("Redis unavailable, falling back to local reply cache: %s", e)
+
+    cached_reply = gemini_exact_cache.get(key)
+    if cached_reply is not None:
+        gemini_exact_cache.move_to_end(key)
+    return cached_reply
+
+async def remember_reply(key: str, embedding: Optional[np.ndarray], reply: str):
+    if embedding is not None:
+        gemini_semantic_cache.add(embedding, reply)
+
+    if app.state.redis is not None:
+        try:
+            await app.state.redis.set(reply_cache_key(key), reply, ex=GEMINI_REPLY_TTL)
+            return
+        except RedisError as e:
+            logger.warning("Redis unavailable, falling back to local reply cache: %s", e)
+
+    gemini_exact_cache[key] = reply
+    gemini_exact_cache.move_to_end(key)
+    if len(gemini_exact_cache) > EXACT_CACHE_SIZE:
+        gemini_exact_cache.popitem(last=False)
+
+# The lookup must never cost more than the generation it is meant to skip.
+EMBEDDING_TIMEOUT = 1.5  # seconds
+
+async def embed_query(text: str) -> Optional[np.ndarray]:
+    """
+    Returns a unit-length embedding for `text`, or None if the embedding call fails or
+    takes longer than EMBEDDING_TIMEOUT.
+    """
     try:
-        prompt = (
-            "First, determine if the following user query is related to Jharkhand tourism, travel, or local culture. "
-            "If it is NOT related, your only response must be the exact string 'OUT_OF_CONTEXT'. "
-            "If it IS related, answer the question briefly and concisely, in 2-3 sentences, as a helpful tourism assistant. "
-            f"User Query: '{message}'"
+        result = await asyncio.wait_for(
+            genai.embed_content_async(
+                model="models/text-embedding-004",
+                content=text,
+                task_type="SEMANTIC_SIMILARITY"
+            ),
+            timeout=EMBEDDING_TIMEOUT
         )
+    except Exception as e:
+        logger.warning("Embedding request failed, skipping semantic cache: %s", e)
+        return None
+    vector = np.asarray(result["embedding"], dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+# --- Gemini Dispatch ---
+class GeminiDispatcher:
+    """
+    Sends each prompt to Gemini straight away over the shared model. The API has no
+    server-side batching, so holding prompts back to group them would only add latency.
+    At most `max_concurrency` generations are in flight, and each one is abandoned after
+    `timeout` seconds.
+    """
+    def __init__(self, model: genai.GenerativeModel, max_concurrency: int = 64, timeout: float = 30.0):
+        self.model = model
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def generate(self, prompt: str, generation_config: Optional[dict] = None):
+        async with self._semaphore:
+            return await asyncio.wait_for(
+                self.model.generate_content_async(prompt, generation_config=generation_config),
+                timeout=self.timeout
+            )
+
+GEMINI_MAX_OUTPUT_TOKENS = 250
+GEMINI_MODEL = genai.GenerativeModel(
+    "gemini-1.5-flash",
+    generation_config={"max_output_tokens": GEMINI_MAX_OUTPUT_TOKENS}
+)
+GEMINI_PROMPT_TEMPLATE = (
+    "First, determine if the following user query is related to Jharkhand tourism, travel, or local culture. "
+    "If it is NOT related, your only response must be the exact string 'OUT_OF_CONTEXT'. "
+    "If it IS related, answer the question briefly and concisely, in 2-3 sentences, as a helpful tourism assistant. "
+    "User Query: '{message}'"
+)
+DOUBLE_NEWLINE_RE = re.compile(r"\n{2,}")
+gemini_dispatcher = GeminiDispatcher(GEMINI_MODEL)
+
+
+# --- Chatbot Helper Functions ---
+def connect_redis(url: str) -> aioredis.Redis:
+    # redis-py waits forever by default; its TimeoutError is a RedisError, so the
+    # local-state fallbacks also cover a Redis that accepts connections but never answers.
+    return aioredis.from_url(url, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT)
+
+async def mark_greeted(user_id: str) -> bool:
+    """Records that `user_id` has been greeted and returns True if this was their first greeting."""
+    if app.state.redis is not None:
+        try:
+            return bool(await app.state.redis.set(f"greet:{user_id}", "1", nx=True, ex=GREETING_TTL))
+        except RedisError as e:
+            logger.warning("Redis unavailable, falling back to local greeting state: %s", e)
+
+    if user_id in greeted_users:
+        return False
+    greeted_users[user_id] = True
+    return True
+
+async def query_gemini(message: str, max_tokens: int = GEMINI_MAX_OUTPUT_TOKENS) -> str:
+    # Repeated and near-duplicate questions are answered from the exact or semantic cache.
+    key = message.strip().lower()
+    cached_reply = await get_cached_reply(key)
+    if cached_reply is not None:
+        return cached_reply
+
+    embedding = await embed_query(key)
+    if embedding is not None:
+        cached_reply = gemini_semantic_cache.lookup(embedding)
+        if cached_reply is not None:
+            await remember_reply(key, None, cached_reply)
+            return cached_reply
+
+    try:
+        prompt = GEMINI_PROMPT_TEMPLATE.format(message=message)
+        # The shared model already carries the default token limit.
+        generation_config = None if max_tokens == GEMINI_MAX_OUTPUT_TOKENS else {"max_output_tokens": max_tokens}
         
-        response = await model.generate_content_async(
-            prompt,
-            generation_config={"max_output_tokens": max_tokens}
-        )
+        response = await gemini_dispatcher.generate(prompt, generation_config=generation_config)
         
         finish_reason = response.candidates[0].finish_reason.name
         reply = response.text or ""
         reply = reply.strip()
 
         if reply == "OUT_OF_CONTEXT":
-            return "I can only answer questions about Jharkhand tourism. How can I help you with your trip?"
-
-        if finish_reason == "STOP":
-            reply = re.sub(r"\n{2,}", "\n", reply)
-            return reply
+            reply = "I can only answer questions about Jharkhand tourism. How can I help you with your trip?"
+        elif finish_reason == "STOP":
+            if "\n\n" in reply:
+                reply = DOUBLE_NEWLINE_RE.sub("\n", reply)
         else:
             return "I couldn't complete the response. Please try rephrasing your question."
 
+        # Only complete answers are cached; truncations and errors are retried next time.
+        await remember_reply(key, embedding, reply)
+        return reply
+
     except Exception as e:
-        print(f"Error calling Gemini API: {e}")
+        logger.exception("Error calling Gemini API: %s", e)
         return "Sorry, an error occurred while contacting the AI model."
 
 
+# --- Activity Log Writer ---
+ACTIVITY_BATCH_SIZE = 100
+ACTIVITY_FLUSH_INTERVAL = 0.2  # seconds
+ACTIVITY_QUEUE_SIZE = 10_000
+ACTIVITY_RETRY_DELAY = 1.0  # seconds
+
+def enqueue_activity(row: dict) -> bool:
+    """Queues `row` for the writer; returns False (and drops it) when the queue is full."""
+    try:
+        app.state.activity_queue.put_nowait(row)
+        return True
+    except asyncio.QueueFull:
+        logger.warning("Activity log queue is full, dropping row for user '%s'", row.get('user_id'))
+        return False
+
+async def write_activity_rows(rows: List[dict]):
+    # One retry rides out a transient Supabase failure; after that the batch is dropped so
+    # the queue keeps moving.
+    for attempt in range(2):
+        try:
+            await app.state.supabase.table('user_activity_log').insert(rows).execute()
+            return
+        except Exception as e:
+            if attempt == 0:
+                logger.warning("Failed to write %d activity log row(s), retrying: %s", len(rows), e)
+                await asyncio.sleep(ACTIVITY_RETRY_DELAY)
+            else:
+                logger.exception("Dropping %d activity log row(s) after retry: %s", len(rows), e)
+
+async def activity_log_writer(queue: asyncio.Queue):
+    """
+    Drains queued activity rows and inserts them in batches of up to ACTIVITY_BATCH_SIZE,
+    flushing at least every ACTIVITY_FLUSH_INTERVAL. A None item flushes and stops the writer.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        row = await queue.get()
+        if row is None:
+            return
+        rows = [row]
+        deadline = loop.time() + ACTIVITY_FLUSH_INTERVAL
+        while len(rows) < ACTIVITY_BATCH_SIZE:
+            try:
+                row = await asyncio.wait_for(queue.get(), timeout=deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+            if row is None:
+                await write_activity_rows(rows)
+                return
+            rows.append(row)
+        await write_activity_rows(rows)
+
+
+# --- Blockchain Helpers ---
+class AsyncByteReader:
+    """Adapts an async byte iterator to the async `read()` interface ijson expects."""
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    async def read(self, size: int = -1) -> bytes:
+        # ijson probes the source type with read(0); that must not consume a chunk.
+        if size == 0:
+            return b""
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return b""
+
+    async def drain(self, limit: int):
+        """Reads and discards the rest of the stream, giving up once more than `limit` bytes remain."""
+        drained = 0
+        async for chunk in self._chunks:
+            drained += len(chunk)
+            if drained > limit:
+                return
+
+def invalid_sales_format(sales_type) -> HTTPException:
+    logger.error("Response from blockchain service is not a list. Type is: %s", sales_type)
+    return HTTPException(status_code=500, detail="Invalid response format from blockchain service.")
+
+async def stream_sales(reader: AsyncByteReader):
+    """
+    Yields the elements of the top-level JSON array read from `reader`, one at a time.
+    A body that is not an array raises the invalid-format error before anything is yielded.
+    """
+    events = ijson.parse(reader, use_float=True)
+    async for prefix, event, value in events:
+        if (prefix, event) != ("", "start_array"):
+            raise invalid_sales_format(event)
+        break
+
+    builder = None
+    async for prefix, event, value in events:
+        if builder is None:
+            if prefix != "item":
+                continue
+            if event not in ("start_map", "start_array"):
+                yield value
+                continue
+            builder = ijson.ObjectBuilder()
+        builder.event(event, value)
+        if prefix == "item" and event in ("end_map", "end_array"):
+            yield builder.value
+            builder = None
+
+async def find_sale(product_id: str, tx_id: str) -> Optional[dict]:
+    """
+    Looks up `tx_id` among the on-chain sales of `product_id`. With ijson available the
+    sales list is streamed and reading stops at the first match; only a fully read list
+    is cached as the product's index. A cached index only answers hits: a miss may be a
+    sale recorded after it was built, so the chain is queried again.
+    """
+    sales_index = sales_index_by_product.get(product_id)
+    if sales_index is not None and tx_id in sales_index:
+        return sales_index[tx_id]
+
+    service_path = f"/query/sales/{product_id}"
+    logger.debug("Calling blockchain service at: %s%s", settings.blockchain_service_url, service_path)
+    async with app.state.http.stream("GET", service_path, timeout=10.0) as response:
+        logger.debug("Received response from blockchain service. Status: %s", response.status_code)
+        if response.is_error:
+            await response.aread()
+        response.raise_for_status()
+
+        if ijson is not None:
+            sales_index = {}
+            reader = AsyncByteReader(response.aiter_bytes())
+            # Close the parser before the response is released on an early return.
+            async with contextlib.aclosing(stream_sales(reader)) as sales:
+                async for sale in sales:
+                    if not isinstance(sale, dict):
+                        continue
+                    sales_index[sale.get("txID")] = sale
+                    if sale.get("txID") == tx_id:
+                        await reader.drain(SALES_DRAIN_LIMIT)
+                        return sale
+        else:
+            await response.aread()
+            sales = response.json()
+            if not isinstance(sales, list):
+                raise invalid_sales_format(type(sales))
+            sales_index = {sale.get("txID"): sale for sale in sales if isinstance(sale, dict)}
+
+    sales_index_by_product[product_id] = sales_index
+    return sales_index.get(tx_id)
+
+
 # --- API Endpoints ---
 
 @app.get("/")
@@ -135,53 +548,49 @@ async def root():
 
 @app.post("/chat")
 async def chat(request: ChatRequest):
-    user_id = request.user_id
-    user_message = request.message.lower()
-
-    if user_id not in greeted_users:
-        greeted_users.add(user_id)
+    # First contact gets the static greeting without the message being looked at.
+    if await mark_greeted(request.user_id):
         return {"reply": "👋 Hello! Welcome to Jharkhand Tourism Chatbot. How can I help you today?"}
 
+    message = request.message
+    user_message = message if message.islower() else message.casefold()
+
     # --- Local Knowledge Base Logic ---
-    if "itinerary" in user_message or re.search(r"plan.*day", user_message):
-        days_match = re.search(r"(\d+)\s*day", user_message)
+    prefix = user_message[:ITINERARY_SCAN_LIMIT]
+    if ITINERARY_RE.search(prefix):
+        days_match = DAYS_RE.search(prefix)
         days = int(days_match.group(1)) if days_match else 3
-        interests = [i for i in interest_map if i in user_message] or ["nature"]
-        selected_places = [p for i in interests for p in interest_map.get(i, [])] or list(places.keys())
+        interests = [i for i in INTEREST_KEYS if i in prefix] or ["nature"]
+        selected_places = tuple(chain.from_iterable(INTEREST_PLACES.get(i, ()) for i in interests)) or ALL_PLACES
         
         if not selected_places:
              return {"reply": "I couldn't find any places matching your interests."}
 
-        plan = {}
-        for i in range(days):
-            place_name = selected_places[i % len(selected_places)]
-            info = places.get(place_name, {})
-            plan[f"Day {i+1}"] = (
-                f"📍 {place_name.capitalize()} - {info.get('description', 'N/A')}\n"
-                f"   🕒 Best time: {info.get('best_time', 'N/A')}\n"
-                f"   🎯 Activities: {info.get('activities', 'N/A')}"
-            )
-        return {"reply": "\n\n".join(plan.values())}
+        count = len(selected_places)
+        return {"reply": "\n\n".join(PLACE_LINES[selected_places[i % count]] for i in range(days))}
 
-    for place, info in places.items():
-        if place in user_message:
-            return {"reply": f"{place.capitalize()}: {info['description']}"}
+    place_match = PLACE_RE.search(user_message) if PLACE_RE else None
+    if place_match:
+        place = place_match.group(0)
+        return {"reply": f"{place.capitalize()}: {places[place]['description']}"}
 
     # --- Fallback to Gemini ---
     try:
         gemini_reply = await query_gemini(user_message)
         return {"reply": gemini_reply}
     except Exception as e:
-        print(f"Error in chat logic: {e}")
+        logger.exception("Error in chat logic: %s", e)
         return {"reply": "❌ Sorry, I had trouble processing your request."}
 
-@app.get("/products", response_model=List[Product])
-def get_products():
+# Rows come straight from our own table, so they are built with model_construct and the
+# schema is documented via `responses` instead of response_model, skipping both validations.
+@app.get("/products", responses={200: {"model": List[Product]}})
+async def get_products():
     try:
-        response = supabase.table('products').select('*').order('id').execute()
-        return [Product(**p) for p in response.data]
+        response = await app.state.supabase.table('products').select('*').order('id').execute()
+        return [Product.model_construct(**p) for p in response.data]
     except Exception as e:
-        print(f"An unexpected error occurred while fetching products: {e}")
+        logger.exception("An unexpected error occurred while fetching products: %s", e)
         raise HTTPException(status_code=500, detail="An unexpected error occurred.")
 
 @app.post("/record-transaction", response_model=SaleReceipt)
@@ -190,99 +599,90 @@ async def record_transaction(transaction: TransactionRequest):
     Records a transaction by forwarding the request to the dedicated blockchain microservice.
     """
     try:
-        print(f"INFO (Main App): Forwarding transaction to blockchain service...")
+        logger.debug("Forwarding transaction for product_id '%s' to blockchain service", transaction.product_id)
         
         payload = {
             "product_id": str(transaction.product_id),
             "price": str(transaction.price)
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{settings.blockchain_service_url}/record-transaction-on-chain",
-                json=payload,
-                timeout=30.0 
-            )
+        response = await app.state.http.post("/record-transaction-on-chain", json=payload)
         
         response.raise_for_status() 
-        
-        return response.json()
+        receipt = response.json()
+        # The product's cached index predates this sale.
+        sales_index_by_product.pop(str(transaction.product_id), None)
+
+        # The activity row goes to the background writer, so its Supabase round-trip
+        # overlaps with other work instead of being added to this response's latency. If the
+        # queue is full the row is dropped; the transaction itself is already on-chain.
+        enqueue_activity({
+            'user_id': transaction.user_id,
+            'action': f"record_transaction:{transaction.product_id}:{receipt.get('txID')}"
+        })
+        return receipt
 
     except httpx.RequestError as e:
-        print(f"An error occurred while requesting blockchain service: {e}")
+        logger.error("An error occurred while requesting blockchain service: %s", e)
         raise HTTPException(status_code=503, detail="The blockchain service is unavailable.")
     except Exception as e:
-        print(f"An unexpected error occurred during transaction forwarding: {e}")
+        logger.exception("An unexpected error occurred during transaction forwarding: %s", e)
         raise HTTPException(status_code=500, detail="An internal error occurred.")
 
-# UPDATED: Endpoint with detailed logging for debugging
+# Detailed tracing is available at LOG_LEVEL=DEBUG
 @app.get("/verify-transaction", response_model=SaleReceipt)
 async def verify_transaction(product_id: str, tx_id: str):
     """
     Verifies a transaction by querying the blockchain microservice and finding the matching record.
     """
-    service_url = f"{settings.blockchain_service_url}/query/sales/{product_id}"
-    print("\n--- VERIFICATION PROCESS STARTED ---")
-    print(f"INFO (Main App): Verifying tx_id '{tx_id}' for product_id '{product_id}'")
-    print(f"INFO (Main App): Calling blockchain service at: {service_url}")
+    cached_sale = verified_sales.get((product_id, tx_id))
+    if cached_sale is not None:
+        return cached_sale
 
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(service_url, timeout=10.0)
-        
-        print(f"INFO (Main App): Received response from blockchain service. Status: {response.status_code}")
-        print(f"INFO (Main App): Raw response body: {response.text}")
+    logger.debug("Verifying tx_id '%s' for product_id '%s'", tx_id, product_id)
 
-        response.raise_for_status()
-        
-        sales = response.json()
-        print(f"INFO (Main App): Successfully parsed JSON response.")
-
-        if not isinstance(sales, list):
-            print(f"ERROR (Main App): Response from blockchain service is not a list. Type is: {type(sales)}")
-            raise HTTPException(status_code=500, detail="Invalid response format from blockchain service.")
-
-        print(f"INFO (Main App): Searching for tx_id '{tx_id}' in {len(sales)} sale record(s)...")
-        for sale in sales:
-            print(f"  - Checking record with txID: {sale.get('txID')}")
-            if sale.get("txID") == tx_id:
-                print("SUCCESS (Main App): Verification successful. Transaction found.")
-                print("--- VERIFICATION PROCESS ENDED ---\n")
-                return sale
+    try:
+        sale = await find_sale(product_id, tx_id)
+        if sale is not None:
+            logger.debug("Verification successful. Transaction '%s' found.", tx_id)
+            verified_sales[(product_id, tx_id)] = sale
+            return sale
         
-        print(f"WARN (Main App): Verification failed. Transaction ID '{tx_id}' not found for this product.")
-        print("--- VERIFICATION PROCESS ENDED ---\n")
+        logger.info("Verification failed. Transaction ID '%s' not found for product_id '%s'.", tx_id, product_id)
         raise HTTPException(status_code=404, detail="Transaction ID not found for the given product.")
 
+    except HTTPException:
+        raise
+
     except httpx.RequestError as e:
-        print(f"ERROR (Main App): Could not connect to blockchain service. Is it running? Error: {e}")
-        print("--- VERIFICATION PROCESS ENDED ---\n")
+        logger.error("Could not connect to blockchain service. Is it running? Error: %s", e)
         raise HTTPException(status_code=503, detail="The blockchain service is unavailable.")
     
     except httpx.HTTPStatusError as e:
-        print(f"ERROR (Main App): Blockchain service returned an error. Status: {e.response.status_code}. Body: {e.response.text}")
-        print("--- VERIFICATION PROCESS ENDED ---\n")
+        logger.error("Blockchain service returned an error. Status: %s. Body: %s", e.response.status_code, e.response.text)
         raise HTTPException(status_code=502, detail=f"An error occurred in the blockchain service: {e.response.text}")
 
-    except json.JSONDecodeError:
-        print(f"ERROR (Main App): Failed to decode JSON response from blockchain service.")
-        print("--- VERIFICATION PROCESS ENDED ---\n")
+    except JSON_DECODE_ERRORS:
+        logger.error("Failed to decode JSON response from blockchain service.")
         raise HTTPException(status_code=500, detail="Received an invalid (non-JSON) response from the blockchain service.")
 
     except Exception as e:
-        print(f"ERROR (Main App): An unexpected error occurred during verification: {e}")
-        print("--- VERIFICATION PROCESS ENDED ---\n")
+        logger.exception("An unexpected error occurred during verification: %s", e)
         raise HTTPException(status_code=500, detail="An internal error occurred during verification.")
 
-@app.post("/log-activity")
-def log_activity(activity: ActivityLogRequest):
-    try:
-        supabase.table('user_activity_log').insert({
-            'user_id': activity.user_id,
-            'action': activity.action
-        }).execute()
-        return {"status": "success", "message": "Activity logged."}
-    except Exception as e:
-        print(f"An error occurred while logging activity: {e}")
-        raise HTTPException(status_code=500, detail="Failed to log activity.")
-
+@app.post("/log-activity", status_code=202)
+async def log_activity(activity: ActivityLogRequest):
+    queued = enqueue_activity({
+        'user_id': activity.user_id,
+        'action': activity.action
+    })
+    if not queued:
+        raise HTTPException(status_code=503, detail="Activity logging is temporarily overloaded.")
+    return {"status": "accepted", "message": "Activity queued for logging."}
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # uvloop and httptools come with uvicorn[standard]. With more than one worker, set
+    # REDIS_URL so greeting state and cached replies are shared between the processes.
+    uvicorn.run("main:app", loop="uvloop", http="httptools", workers=settings.workers)
@@ -0,0 +1,6 @@
+import os
+
+# main.py builds its Settings at import time, so the required values must exist first.
+os.environ.setdefault("SUPABASE_URL", "http://supabase.test")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+import main
+
+
+class FlakySupabase:
+    def __init__(self, failures):
+        self.failures = failures
+        self.attempts = 0
+        self.written = []
+
+    def table(self, name):
+        return self
+
+    def insert(self, rows):
+        self.rows = rows
+        return self
+
+    async def execute(self):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise RuntimeError("supabase down")
+        self.written.extend(self.rows)
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(main, "ACTIVITY_RETRY_DELAY", 0)
+
+
+def test_failed_batch_is_retried_once():
+    main.app.state.supabase = FlakySupabase(failures=1)
+    asyncio.run(main.write_activity_rows([{"user_id": "u", "action": "a"}]))
+
+    assert main.app.state.supabase.attempts == 2
+    assert main.app.state.supabase.written == [{"user_id": "u", "action": "a"}]
+
+
+def test_batch_is_dropped_after_retry():
+    main.app.state.supabase = FlakySupabase(failures=5)
+    asyncio.run(main.write_activity_rows([{"user_id": "u", "action": "a"}]))
+
+    assert main.app.state.supabase.attempts == 2
+    assert main.app.state.supabase.written == []
+
+
+def test_log_activity_returns_503_when_queue_is_full():
+    async def scenario():
+        main.app.state.activity_queue = asyncio.Queue(maxsize=1)
+        request = main.ActivityLogRequest(user_id="u", action="a")
+        assert (await main.log_activity(request))["status"] == "accepted"
+        await main.log_activity(request)
+
+    with pytest.raises(main.HTTPException) as excinfo:
+        asyncio.run(scenario())
+
+    assert excinfo.value.status_code == 503
@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import main
+
+pytest.importorskip("ijson")
+
+SALES = [
+    {"productID": "7", "price": "10.0", "timestamp": "2024-01-01T00:00:00Z", "txID": f"tx{i}"}
+    for i in range(50)
+]
+
+
+class ChunkedStream(httpx.AsyncByteStream):
+    def __init__(self, body: bytes, chunk_size: int):
+        self.body = body
+        self.chunk_size = chunk_size
+
+    async def __aiter__(self):
+        for start in range(0, len(self.body), self.chunk_size):
+            yield self.body[start:start + self.chunk_size]
+
+
+def run_find_sale(body: bytes, tx_id: str, chunk_size: int = 64):
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/query/sales/7"
+        return httpx.Response(200, stream=ChunkedStream(body, chunk_size))
+
+    async def scenario():
+        main.app.state.http = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler), base_url="http://chain.test"
+        )
+        try:
+            return await main.find_sale("7", tx_id)
+        finally:
+            await main.app.state.http.aclose()
+
+    return asyncio.run(scenario())
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    main.sales_index_by_product.clear()
+    yield
+    main.sales_index_by_product.clear()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 64, 1 << 20])
+def test_find_sale_streams_multi_record_body(chunk_size):
+    body = json.dumps(SALES).encode()
+
+    assert run_find_sale(body, "tx42", chunk_size) == SALES[42]
+    assert run_find_sale(body, "tx0", chunk_size) == SALES[0]
+
+
+def test_find_sale_caches_index_after_full_read():
+    body = json.dumps(SALES).encode()
+
+    assert run_find_sale(body, "missing") is None
+    assert set(main.sales_index_by_product["7"]) == {sale["txID"] for sale in SALES}
+
+
+@pytest.mark.parametrize("body", [b'{"error": "chaincode unavailable"}', b'"oops"', b"null"])
+def test_find_sale_rejects_non_list_body_without_caching(body):
+    with pytest.raises(main.HTTPException) as excinfo:
+        run_find_sale(body, "tx1")
+
+    assert excinfo.value.status_code == 500
+    assert "7" not in main.sales_index_by_product
+
+
+def test_find_sale_skips_non_dict_items():
+    body = json.dumps([1, "x", [2, {"txID": "tx1"}], None, SALES[3]]).encode()
+
+    assert run_find_sale(body, "missing") is None
+    assert main.sales_index_by_product["7"] == {"tx3": SALES[3]}
+
+
+def test_find_sale_reuses_connection_after_early_match():
+    body = json.dumps(SALES).encode()
+    connections = []
+
+    async def serve(reader, writer):
+        connections.append(writer)
+        while await reader.readuntil(b"\r\n\r\n"):
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                + f"Content-Length: {len(body)}\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+
+    async def scenario():
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        main.app.state.http = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}")
+        try:
+            for _ in range(5):
+                main.sales_index_by_product.clear()
+                assert await main.find_sale("7", "tx1") == SALES[1]
+        finally:
+            await main.app.state.http.aclose()
+            server.close()
+
+    asyncio.run(scenario())
+    assert len(connections) == 1
@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+
+import main
+
+
+class FakeModel:
+    def __init__(self, delays):
+        self.delays = delays
+        self.in_flight = 0
+        self.peak = 0
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delays.get(prompt, 0.01))
+            if prompt == "bad":
+                raise ValueError(prompt)
+            return prompt.upper()
+        finally:
+            self.in_flight -= 1
+
+
+def run_with_dispatcher(model, scenario, **options):
+    return asyncio.run(scenario(main.GeminiDispatcher(model, **options)))
+
+
+def test_results_and_errors_reach_their_callers():
+    async def scenario(dispatcher):
+        return await asyncio.gather(
+            *(dispatcher.generate(f"p{i}") for i in range(20)),
+            dispatcher.generate("bad"),
+            return_exceptions=True
+        )
+
+    results = run_with_dispatcher(FakeModel({}), scenario)
+
+    assert results[:20] == [f"P{i}" for i in range(20)]
+    assert isinstance(results[20], ValueError)
+
+
+def test_fast_call_is_not_held_behind_slow_call():
+    async def scenario(dispatcher):
+        slow = asyncio.create_task(dispatcher.generate("slow"))
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        assert await dispatcher.generate("fast") == "FAST"
+        elapsed = time.monotonic() - started
+        slow.cancel()
+        return elapsed
+
+    elapsed = run_with_dispatcher(FakeModel({"slow": 2.0, "fast": 0.05}), scenario)
+
+    assert elapsed < 0.5
+
+
+def test_hung_call_times_out():
+    async def scenario(dispatcher):
+        with pytest.raises(asyncio.TimeoutError):
+            await dispatcher.generate("hang")
+        return await dispatcher.generate("ok")
+
+    assert run_with_dispatcher(FakeModel({"hang": 10.0}), scenario, timeout=0.1) == "OK"
+
+
+def test_concurrency_is_capped():
+    model = FakeModel({})
+
+    async def scenario(dispatcher):
+        return await asyncio.gather(*(dispatcher.generate(f"p{i}") for i in range(30)))
+
+    run_with_dispatcher(model, scenario, max_concurrency=4)
+
+    assert model.peak == 4
+
+
+def test_single_prompt_is_sent_without_waiting():
+    model = FakeModel({"p": 1.0})
+
+    async def scenario(dispatcher):
+        task = asyncio.create_task(dispatcher.generate("p"))
+        # A few loop turns cover wait_for's inner task; no timer has a chance to fire.
+        for _ in range(3):
+            await asyncio.sleep(0)
+        in_flight = model.in_flight
+        task.cancel()
+        return in_flight
+
+    assert run_with_dispatcher(model, scenario) == 1
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+import main
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, name):
+        return self.store.get(name)
+
+    async def set(self, name, value, ex=None):
+        self.store[name] = value.encode()
+        return True
+
+
+class BrokenRedis:
+    async def get(self, name):
+        raise RedisConnectionError("down")
+
+    async def set(self, name, value, ex=None):
+        raise RedisConnectionError("down")
+
+
+@pytest.fixture(autouse=True)
+def clear_local_cache():
+    main.gemini_exact_cache.clear()
+    yield
+    main.gemini_exact_cache.clear()
+    main.app.state.redis = None
+
+
+def test_exact_reply_is_shared_through_redis(monkeypatch):
+    main.app.state.redis = FakeRedis()
+    asyncio.run(main.remember_reply("what is hundru?", None, "A waterfall."))
+
+    assert not main.gemini_exact_cache
+
+    async def no_generation(*args, **kwargs):
+        raise AssertionError("cached reply should skip Gemini")
+
+    monkeypatch.setattr(main, "embed_query", no_generation)
+    monkeypatch.setattr(main.gemini_dispatcher, "generate", no_generation)
+
+    assert asyncio.run(main.query_gemini("  What is Hundru?")) == "A waterfall."
+
+
+def test_exact_reply_falls_back_to_local_cache_without_redis():
+    main.app.state.redis = BrokenRedis()
+    asyncio.run(main.remember_reply("what is hundru?", None, "A waterfall."))
+
+    assert main.gemini_exact_cache["what is hundru?"] == "A waterfall."
+    assert asyncio.run(main.get_cached_reply("what is hundru?")) == "A waterfall."
+
+
+async def hung_redis_server():
+    # Accepts connections and reads commands but never replies.
+    async def swallow(reader, writer):
+        while await reader.read(1024):
+            pass
+        writer.close()
+
+    return await asyncio.start_server(swallow, "127.0.0.1", 0)
+
+
+def test_hung_redis_falls_back_to_local_state(monkeypatch):
+    monkeypatch.setattr(main, "REDIS_TIMEOUT", 0.05)
+    main.greeted_users.clear()
+
+    async def scenario():
+        server = await hung_redis_server()
+        port = server.sockets[0].getsockname()[1]
+        main.app.state.redis = main.connect_redis(f"redis://127.0.0.1:{port}")
+        try:
+            first = await main.mark_greeted("user-1")
+            await main.remember_reply("what is hundru?", None, "A waterfall.")
+            cached = await main.get_cached_reply("what is hundru?")
+            return first, cached
+        finally:
+            await main.app.state.redis.aclose()
+            server.close()
+            await server.wait_closed()
+
+    started = time.monotonic()
+    assert asyncio.run(scenario()) == (True, "A waterfall.")
+    assert time.monotonic() - started < 1
+    main.greeted_users.clear()
+
+
+def test_hung_embedding_call_is_skipped(monkeypatch):
+    main.app.state.redis = None
+
+    async def hang(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(main, "EMBEDDING_TIMEOUT", 0.05)
+    monkeypatch.setattr(main.genai, "embed_content_async", hang)
+
+    started = time.monotonic()
+    assert asyncio.run(main.embed_query("what is hundru?")) is None
+    assert time.monotonic() - started < 1
@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import main
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    main.sales_index_by_product.clear()
+    main.verified_sales.clear()
+    yield
+    main.sales_index_by_product.clear()
+    main.verified_sales.clear()
+
+
+@pytest.fixture(params=[True, False], ids=["ijson", "bulk"])
+def streaming(request, monkeypatch):
+    if request.param:
+        pytest.importorskip("ijson")
+    else:
+        monkeypatch.setattr(main, "ijson", None)
+
+
+def chain_service():
+    sales = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            payload = json.loads(request.content)
+            sale = {
+                "productID": payload["product_id"],
+                "price": payload["price"],
+                "timestamp": "2024-01-01T00:00:00Z",
+                "txID": f"tx{len(sales) + 1}"
+            }
+            sales.append(sale)
+            return httpx.Response(200, json=sale)
+        return httpx.Response(200, json=sales)
+
+    return handler
+
+
+def test_recorded_transaction_verifies_immediately(streaming):
+    async def scenario():
+        main.app.state.http = httpx.AsyncClient(
+            transport=httpx.MockTransport(chain_service()), base_url="http://chain.test"
+        )
+        main.app.state.activity_queue = asyncio.Queue()
+        try:
+            with pytest.raises(main.HTTPException) as excinfo:
+                await main.verify_transaction("7", "typo")
+            assert excinfo.value.status_code == 404
+            assert "7" in main.sales_index_by_product
+
+            receipt = await main.record_transaction(
+                main.TransactionRequest(productId=7, price=10.0)
+            )
+            assert "7" not in main.sales_index_by_product
+
+            return receipt, await main.verify_transaction("7", receipt["txID"])
+        finally:
+            await main.app.state.http.aclose()
+
+    receipt, verified = asyncio.run(scenario())
+    assert verified == receipt
+
+
+def test_cached_index_miss_queries_chain_again(streaming):
+    async def scenario():
+        handler = chain_service()
+        main.app.state.http = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler), base_url="http://chain.test"
+        )
+        try:
+            assert await main.find_sale("7", "tx1") is None
+            # A sale written by someone else, without going through record_transaction.
+            await main.app.state.http.post("/record-transaction-on-chain", json={"product_id": "7", "price": "1"})
+            return await main.find_sale("7", "tx1")
+        finally:
+            await main.app.state.http.aclose()
+
+    assert asyncio.run(scenario())["txID"] == "tx1"